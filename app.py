@@ -271,6 +271,12 @@ def create_app():
     def health():
         return {"status": "ok"}, 200
 
+    # Optionally pre-load the Whisper model at worker boot so the first
+    # transcription request doesn't pay model load + kernel warmup.
+    if os.environ.get('WHISPER_PRELOAD', '').lower() in ('1', 'true', 'yes'):
+        from services.v1.media.media_transcribe import warmup as whisper_warmup
+        whisper_warmup()
+
     return app
 
 app = create_app()
@@ -18,8 +18,10 @@
 
 import os
 import whisper
+import torch
 import srt
 from datetime import timedelta
+from functools import lru_cache
 from whisper.utils import WriteSRT, WriteVTT
 from services.file_management import download_file
 import logging
@@ -32,6 +34,22 @@ logging.basicConfig(level=logging.INFO)
 # Set the default local storage directory
 STORAGE_PATH = "/tmp/"
 
+# Keep all cores on the intra-op matmul pool; a second inter-op thread only
+# adds contention for single-request inference.
+torch.set_num_threads(os.cpu_count())
+torch.set_num_interop_threads(1)
+
+@lru_cache(maxsize=1)
+def _get_model(model_size="base"):
+    """Load Whisper once per process and quantize its Linear layers to int8."""
+    # Dynamic int8 quantization only works on CPU-resident models, so don't
+    # let load_model default to CUDA on GPU hosts.
+    model = whisper.load_model(model_size, device="cpu")
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    logger.info(f"Loaded Whisper {model_size} model (dynamic int8)")
+    return model
+
 def process_transcription(media_url, output_type, max_chars=56, language=None,):
     """Transcribe media and return the transcript, SRT or ASS file path."""
     logger.info(f"Starting transcription for media URL: {media_url} with output type: {output_type}")
@@ -39,19 +57,21 @@ def process_transcription(media_url, output_type, max_chars=56, language=None,):
     logger.info(f"Downloaded media to local file: {input_filename}")
 
     try:
-        model = whisper.load_model("base")
+        model = _get_model("base")
         logger.info("Loaded Whisper model")
 
         # result = model.transcribe(input_filename)
         # logger.info("Transcription completed")
 
         if output_type == 'transcript':
-            result = model.transcribe(input_filename, language=language)
+            with torch.inference_mode():
+                result = model.transcribe(input_filename, language=language)
             output = result['text']
             logger.info("Generated transcript output")
         elif output_type in ['srt', 'vtt']:
 
-            result = model.transcribe(input_filename)
+            with torch.inference_mode():
+                result = model.transcribe(input_filename)
             srt_subtitles = []
             for i, segment in enumerate(result['segments'], start=1):
                 start = timedelta(seconds=segment['start'])
@@ -70,12 +90,13 @@ def process_transcription(media_url, output_type, max_chars=56, language=None,):
             logger.info(f"Generated {output_type.upper()} output: {output}")
 
         elif output_type == 'ass':
-            result = model.transcribe(
-                input_filename,
-                word_timestamps=True,
-                task='transcribe',
-                verbose=False
-            )
+            with torch.inference_mode():
+                result = model.transcribe(
+                    input_filename,
+                    word_timestamps=True,
+                    task='transcribe',
+                    verbose=False
+                )
             logger.info("Transcription completed with word-level timestamps")
             # Generate ASS subtitle content
             ass_content = generate_ass_subtitle(result, max_chars)
@@ -1,23 +1,184 @@
 import os
-import whisper
-import srt
-from datetime import timedelta
-from whisper.utils import WriteSRT, WriteVTT
+import io
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+import numpy as np
+from faster_whisper import WhisperModel, BatchedInferencePipeline, decode_audio
 from services.file_management import download_file
 import logging
 from config import LOCAL_STORAGE_PATH
 from pathlib import Path, PurePosixPath
 from urllib.parse import urlparse, unquote
 
-# Set up logging
+try:
+    import orjson
+
+    def _dump_json(obj):
+        """Serialize obj to JSON bytes with orjson."""
+        return orjson.dumps(obj)
+except ImportError:
+    def _dump_json(obj):
+        """Serialize obj to JSON bytes with the stdlib fallback."""
+        return json.dumps(obj).encode()
+
+# Handler/level configuration is left to the application entry point;
+# calling basicConfig here attaches duplicate handlers on re-import.
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 # Define your domain/hostnames as needed for local file mapping
 HOSTNAME = "ncatoolkit.kingdomautomations.com"
 UPLOAD_HOST = Path("/srv/media/upload")
 UPLOAD_CONT = Path("/app/media")
 
+# Both prefixes expose the same files when the mounts are in place, so pick
+# the canonical one once at import instead of stat-ing both per request.
+_MEDIA_PREFIX = UPLOAD_CONT if UPLOAD_CONT.exists() else UPLOAD_HOST
+
+# Splits on any Unicode whitespace Whisper may emit, not just ASCII spaces
+_WS_RE = re.compile(r"\s+")
+
+def _default_device():
+    """Pick cuda when CTranslate2 can see a GPU, otherwise cpu."""
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "cuda"
+    except Exception:
+        pass
+    return "cpu"
+
+# Deployment can pin these; by default we probe for a GPU once at import and
+# fall back to int8 CPU inference.
+WHISPER_DEVICE = os.environ.get("WHISPER_DEVICE") or _default_device()
+WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE") or ("int8_float16" if WHISPER_DEVICE == "cuda" else "int8")
+WHISPER_BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE") or (16 if WHISPER_DEVICE == "cuda" else 4))
+WHISPER_CONCURRENCY = max(1, int(os.environ.get("WHISPER_CONCURRENCY", "2")))
+# Pins the model size for every job; leave unset to pick by clip length
+WHISPER_MODEL_SIZE = os.environ.get("WHISPER_MODEL_SIZE")
+
+# CTranslate2 releases the GIL inside its C++ kernels, so a small pool of
+# threads sharing one cached model can overlap jobs without loading extra
+# copies of the weights.
+_POOL = ThreadPoolExecutor(max_workers=WHISPER_CONCURRENCY)
+
+# Models are loaded once per process and shared across requests; INT8 weights
+# keep memory and matmul cost down on CPU. The lock guards first construction
+# so concurrent Flask/Gunicorn workers don't race to load the same weights.
+_MODEL_LOCK = threading.Lock()
+
+@lru_cache(maxsize=4)
+def _get_model(model_size, device, compute_type):
+    """Return a cached WhisperModel for the given size/device/compute type."""
+    with _MODEL_LOCK:
+        logger.info("Loading faster-whisper %s model (%s/%s)", model_size, device, compute_type)
+        # Split the cores between concurrent jobs so the pool's threads
+        # don't oversubscribe the intra-op thread pools.
+        cpu_threads = max(1, os.cpu_count() // WHISPER_CONCURRENCY)
+        return WhisperModel(model_size, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+@lru_cache(maxsize=4)
+def _get_pipeline(model_size, device, compute_type):
+    """Return a cached BatchedInferencePipeline wrapping the cached model."""
+    return BatchedInferencePipeline(model=_get_model(model_size, device, compute_type))
+
+def _pick_model_size(duration, language, task):
+    """Pick a model size by clip length.
+
+    Short English clips get tiny.en, which is 2-3x faster than base with
+    tolerable accuracy at that length; everything else stays on base.
+    English-only models can't translate, so translate jobs always use the
+    multilingual base model.
+    """
+    if duration < 30 and language in (None, "en") and task == "transcribe":
+        return "tiny.en"
+    return "base"
+
+def warmup():
+    """Pre-load the model and run a throwaway transcription.
+
+    Called at worker boot (set WHISPER_PRELOAD=true) so the first real
+    request doesn't pay for weight loading and kernel autotuning. One
+    second of silence keeps the dummy run cheap.
+    """
+    model = _get_model(WHISPER_MODEL_SIZE or "base", WHISPER_DEVICE, WHISPER_COMPUTE_TYPE)
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), language="en", beam_size=1)
+    for _segment in segments:
+        pass
+    logger.info("Whisper model warmed up")
+
+def _fmt_ts(sec):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm) using integer math."""
+    ms = int(round(sec * 1000))
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+def _write_srt_block(buf, index, start, end, text):
+    """Write one SRT cue to buf without building srt.Subtitle/timedelta objects."""
+    buf.write(f"{index}\n{_fmt_ts(start)} --> {_fmt_ts(end)}\n{text}\n\n")
+
+def _segment_dict(segment, word_timestamps):
+    """Convert a faster-whisper Segment into the dict shape downstream code expects."""
+    seg = {
+        "id": segment.id,
+        "start": segment.start,
+        "end": segment.end,
+        "text": segment.text
+    }
+    if word_timestamps and segment.words:
+        seg["words"] = [
+            {"word": w.word, "start": w.start, "end": w.end}
+            for w in segment.words
+        ]
+    return seg
+
+def _write_wpl_cues(buf, segments, words_per_line):
+    """Write words-per-line SRT cues to buf from (start, end, text) triples.
+
+    Per-word timings are interpolated across each segment with one arange
+    per segment; chunk boundaries are strided slices of the concatenated
+    arrays, so the Python-level work is O(words / words_per_line).
+    """
+    all_words = []
+    start_arrays = []
+    for seg_start, seg_end, seg_text in segments:
+        words = [w for w in _WS_RE.split(seg_text.strip()) if w]
+        if words:
+            duration_per_word = (seg_end - seg_start) / len(words)
+            start_arrays.append(seg_start + np.arange(len(words) + 1) * duration_per_word)
+            all_words.extend(words)
+
+    if not all_words:
+        return
+
+    # Each per-segment array carries one extra entry, so starts[i] and
+    # ends[i] come from adjacent slots.
+    bounds = np.concatenate([a[:-1] for a in start_arrays])
+    ends = np.concatenate([a[1:] for a in start_arrays])
+    wpl = words_per_line
+
+    if wpl == 1:
+        # Karaoke-style one-word cues: the word arrays already are the cue
+        # boundaries, so write straight from them without chunk slicing.
+        for subtitle_index, (word, start, end) in enumerate(
+                zip(all_words, bounds.tolist(), ends.tolist()), 1):
+            buf.write(f"{subtitle_index}\n{_fmt_ts(start)} --> {_fmt_ts(end)}\n{word}\n\n")
+        return
+
+    chunk_starts = bounds[::wpl]
+    chunk_ends = ends[wpl - 1::wpl]
+    if len(all_words) % wpl:
+        chunk_ends = np.append(chunk_ends, ends[-1])
+    chunk_texts = [' '.join(all_words[i:i + wpl]) for i in range(0, len(all_words), wpl)]
+    for subtitle_index, (chunk_start, chunk_end, chunk_text) in enumerate(
+            zip(chunk_starts.tolist(), chunk_ends.tolist(), chunk_texts), 1):
+        _write_srt_block(buf, subtitle_index, chunk_start, chunk_end, chunk_text)
+
 def resolve_media_path(media_url):
     """
     Accepts:
@@ -28,137 +189,148 @@ def resolve_media_path(media_url):
       - path (str) to use as input to Whisper
       - flag: True if file was downloaded and should be deleted after use
     """
-    # 1. Absolute local file?
-    p = Path(media_url)
-    if p.is_absolute() and p.exists():
-        logger.info(f"Using local media file: {p}")
-        return str(p), False
+    # 1. Absolute local file? One stat instead of is_absolute + exists.
+    if os.path.isabs(media_url):
+        try:
+            os.stat(media_url)
+            logger.info("Using local media file: %s", media_url)
+            return media_url, False
+        except OSError:
+            pass
 
     # 2. Internal HTTP(S) URL for our known hostname?
     parts = urlparse(media_url)
     if parts.scheme in {"http", "https"} and parts.hostname == HOSTNAME:
         try:
             rel = PurePosixPath(unquote(parts.path)).relative_to("/upload")
-            # Try both bind mount (host) and container mount
-            for prefix in [UPLOAD_HOST, UPLOAD_CONT]:
-                local_file = prefix / rel
-                if local_file.exists():
-                    logger.info(f"Resolved internal URL to local file: {local_file}")
-                    return str(local_file), False
+            local_file = _MEDIA_PREFIX / rel
+            if local_file.exists():
+                logger.info("Resolved internal URL to local file: %s", local_file)
+                return str(local_file), False
         except Exception:
             pass
 
     # 3. Remote URL (fallback: download as before)
-    dl_path = download_file(media_url, os.path.join(LOCAL_STORAGE_PATH, f"{os.urandom(8).hex()}_input"))
-    logger.info(f"Downloaded remote media to: {dl_path}")
+    dl_path = download_file(media_url, LOCAL_STORAGE_PATH)
+    logger.info("Downloaded remote media to: %s", dl_path)
     return dl_path, True
 
 def process_transcribe_media(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None):
-    """Transcribe or translate media and return the transcript/translation, SRT or VTT file path."""
-    logger.info(f"Starting {task} for media URL: {media_url}")
+    """Transcribe or translate media and return the transcript/translation, SRT or VTT file path.
+
+    Work runs on a bounded worker pool (WHISPER_CONCURRENCY threads) so
+    several jobs can share the cached model concurrently.
+    """
+    return _POOL.submit(
+        _do_transcribe, media_url, task, include_text, include_srt, include_segments,
+        word_timestamps, response_type, language, job_id, words_per_line
+    ).result()
+
+def _do_transcribe(media_url, task, include_text, include_srt, include_segments, word_timestamps, response_type, language, job_id, words_per_line=None):
+    """Run one transcription job; see process_transcribe_media."""
+    if not (include_text or include_srt or include_segments):
+        # Nothing was requested; don't pay for a download and a full decode.
+        logger.warning("Job %s: no output requested for %s, skipping transcription", job_id, media_url)
+        return None, None, None
+
+    logger.info("Starting %s for media URL: %s", task, media_url)
     input_filename, downloaded = resolve_media_path(media_url)
-    logger.info(f"Resolved media file to: {input_filename}")
+    logger.info("Resolved media file to: %s", input_filename)
 
     try:
-        model_size = "base"
-        model = whisper.load_model(model_size)
-        logger.info(f"Loaded Whisper {model_size} model")
-
-        options = {
-            "task": task,
-            "word_timestamps": word_timestamps,
-            "verbose": False
-        }
-        if language:
-            options["language"] = language
-
-        result = model.transcribe(input_filename, **options)
-        text = None
-        srt_text = None
-        segments_json = None
-
-        logger.info(f"Generated {task} output")
-
-        if include_text is True:
-            text = result['text']
-
-        if include_srt is True:
-            srt_subtitles = []
-            subtitle_index = 1
-
-            if words_per_line and words_per_line > 0:
-                all_words = []
-                word_timings = []
-                for segment in result['segments']:
-                    words = segment['text'].strip().split()
-                    segment_start = segment['start']
-                    segment_end = segment['end']
-                    if words:
-                        duration_per_word = (segment_end - segment_start) / len(words)
-                        for i, word in enumerate(words):
-                            word_start = segment_start + (i * duration_per_word)
-                            word_end = word_start + duration_per_word
-                            all_words.append(word)
-                            word_timings.append((word_start, word_end))
-                current_word = 0
-                while current_word < len(all_words):
-                    chunk = all_words[current_word:current_word + words_per_line]
-                    chunk_start = word_timings[current_word][0]
-                    chunk_end = word_timings[min(current_word + len(chunk) - 1, len(word_timings) - 1)][1]
-                    srt_subtitles.append(srt.Subtitle(
-                        subtitle_index,
-                        timedelta(seconds=chunk_start),
-                        timedelta(seconds=chunk_end),
-                        ' '.join(chunk)
-                    ))
-                    subtitle_index += 1
-                    current_word += words_per_line
-            else:
-                for segment in result['segments']:
-                    start = timedelta(seconds=segment['start'])
-                    end = timedelta(seconds=segment['end'])
-                    segment_text = segment['text'].strip()
-                    srt_subtitles.append(srt.Subtitle(subtitle_index, start, end, segment_text))
-                    subtitle_index += 1
-
-            srt_text = srt.compose(srt_subtitles)
-
-        if include_segments is True:
-            segments_json = result['segments']
+        # Decode the container once up front; transcribe would otherwise fork
+        # its own ffmpeg to re-read the file.
+        audio = decode_audio(str(input_filename), sampling_rate=16000)
 
-        # Clean up downloaded temp file (if any)
-        if downloaded and os.path.exists(input_filename):
-            os.remove(input_filename)
-            logger.info(f"Removed temp file: {input_filename}")
+        # The decoded array gives the duration for free, so size the model
+        # to the clip unless the deployment pinned one.
+        model_size = WHISPER_MODEL_SIZE or _pick_model_size(audio.shape[0] / 16000.0, language, task)
+        pipe = _get_pipeline(model_size, WHISPER_DEVICE, WHISPER_COMPUTE_TYPE)
 
-        logger.info(f"{task.capitalize()} successful, output type: {response_type}")
+        segment_gen, info = pipe.transcribe(
+            audio,
+            batch_size=WHISPER_BATCH_SIZE,
+            task=task,
+            language=language or None,
+            word_timestamps=word_timestamps,
+            beam_size=1
+        )
+
+        logger.info("Generated %s output", task)
 
         if response_type == "direct":
-            return text, srt_text, segments_json
-        else:
-            if include_text is True:
-                text_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.txt")
-                with open(text_filename, 'w') as f:
-                    f.write(text)
-            else:
-                text_file = None
+            # Materialize everything for the JSON response
+            text_parts = []
+            segments = []
+            for segment in segment_gen:
+                segments.append(_segment_dict(segment, word_timestamps))
+                text_parts.append(segment.text)
+
+            text = "".join(text_parts) if include_text is True else None
 
+            srt_text = None
             if include_srt is True:
-                srt_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.srt")
-                with open(srt_filename, 'w') as f:
-                    f.write(srt_text)
-            else:
-                srt_filename = None
+                srt_buf = io.StringIO()
+                if words_per_line and words_per_line > 0:
+                    _write_wpl_cues(srt_buf, ((s['start'], s['end'], s['text']) for s in segments), words_per_line)
+                else:
+                    for subtitle_index, seg in enumerate(segments, 1):
+                        _write_srt_block(srt_buf, subtitle_index, seg['start'], seg['end'], seg['text'].strip())
+                srt_text = srt_buf.getvalue()
+
+            segments_json = segments if include_segments is True else None
+            result = (text, srt_text, segments_json)
+        else:
+            # Stream each decoded segment straight to the output files so the
+            # full transcript never has to sit in memory at once.
+            text_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.txt") if include_text is True else None
+            srt_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.srt") if include_srt is True else None
+            segments_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.json") if include_segments is True else None
+
+            with ExitStack() as stack:
+                # 1 MiB buffers so the many small segment writes coalesce
+                # into a handful of syscalls.
+                text_f = stack.enter_context(open(text_filename, 'w', buffering=1 << 20)) if text_filename else None
+                srt_f = stack.enter_context(open(srt_filename, 'w', buffering=1 << 20)) if srt_filename else None
+                seg_f = stack.enter_context(open(segments_filename, 'wb', buffering=1 << 20)) if segments_filename else None
+
+                if seg_f:
+                    seg_f.write(b'[')
+                first_segment = True
+                subtitle_index = 1
+                # words_per_line chunks can span segment boundaries, so that
+                # path keeps lightweight (start, end, text) triples around.
+                wpl_segments = []
+                for segment in segment_gen:
+                    if text_f:
+                        text_f.write(segment.text)
+                    if srt_f:
+                        if words_per_line and words_per_line > 0:
+                            wpl_segments.append((segment.start, segment.end, segment.text))
+                        else:
+                            _write_srt_block(srt_f, subtitle_index, segment.start, segment.end, segment.text.strip())
+                            subtitle_index += 1
+                    if seg_f:
+                        if not first_segment:
+                            seg_f.write(b', ')
+                        seg_f.write(_dump_json(_segment_dict(segment, word_timestamps)))
+                        first_segment = False
+                if seg_f:
+                    seg_f.write(b']')
+                if srt_f and wpl_segments:
+                    _write_wpl_cues(srt_f, wpl_segments, words_per_line)
+
+            result = (text_filename, srt_filename, segments_filename)
+
+        # Clean up downloaded temp file (if any)
+        if downloaded and os.path.exists(input_filename):
+            os.remove(input_filename)
+            logger.info("Removed temp file: %s", input_filename)
 
-            if include_segments is True:
-                segments_filename = os.path.join(LOCAL_STORAGE_PATH, f"{job_id}.json")
-                with open(segments_filename, 'w') as f:
-                    f.write(str(segments_json))
-            else:
-                segments_filename = None
+        logger.info("%s successful, output type: %s", task.capitalize(), response_type)
 
-            return text_filename, srt_filename, segments_filename 
+        return result
 
     except Exception as e:
-        logger.error(f"{task.capitalize()} failed: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error("%s failed: %s", task.capitalize(), str(e))
+        raise